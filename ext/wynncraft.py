@@ -3,9 +3,12 @@
 from __future__ import annotations
 
 from typing import Generator, Union
-import urllib.error # to catch 400 errors (user does not exists)
+import asyncio
 import datetime
 import logging
+import os
+import re
+import time
 
 import discord
 from discord.ext import commands
@@ -17,7 +20,21 @@ import wynncraft
 # Remove wynncraft.py rate limit implementation, let's use our own instead
 wynncraft.CACHE_TIME = 0
 
-from utils import Client, Storage, convert_timedelta
+from utils import (
+    APIClient,
+    APIError,
+    AssetPipeline,
+    Client,
+    HistoryStore,
+    Leaderboard,
+    NotFoundError,
+    SamplingProfiler,
+    Storage,
+    TTLCache,
+    convert_sparkline,
+    convert_timedelta,
+    get_codec,
+)
 
 # Setup logging
 
@@ -32,53 +49,112 @@ EMOJIS = {
     "mage": "<:mage:1047429596926201906>",
     "shaman": "<:shaman:1047429595323965451>",
 }
-PLAYER_CACHE_TIME = 1800
+CLASS_ICON_URL = "https://cdn.wynncraft.com/nextgen/classes/icons/{}.svg"
+EMOJI_SIZE = 128
+CONFIGURATION_WATCH_INTERVAL = 5
+PROFILES_DIRECTORY = "./profiles"
+TARGET_CACHE_TIME = 3600
+NEGATIVE_TARGET_CACHE_TIME = 600
+PROFILE_IDLE_FRAMES = ("select (", "wait (", "_wait_for_tstate_lock (") # waiting threads
+STATS_NAMES = {
+    "total_levels": "Total levels",
+    "playtime": "Playtime",
+    "mob_kills": "Mobs killed",
+}
+HISTORY_POINTS = 30
+LEADERBOARD_SIZE = 10
+BULK_MAX_PLAYERS = 100
+MESSAGE_LIMIT = 2000 # discord message limit
+DIGEST_OFF = 0 # one message per event
+DIGEST_MESSAGE = 1 # one message per window
+DIGEST_EDIT = 2 # edit the previous digest when it is the last message
+DIGEST_CHOICES = [
+    app_commands.Choice(name="Off", value=DIGEST_OFF),
+    app_commands.Choice(name="Merge notifications", value=DIGEST_MESSAGE),
+    app_commands.Choice(name="Edit the last notification", value=DIGEST_EDIT),
+]
+
+def convert_stat(field: str, value: int) -> int:
+    """Converts a recorded statistic to the value shown to the users, the
+    playtime is recorded as returned by the API but shown in hours."""
+    if field == "playtime": # like the embed, see `Stats.total_playtime`
+        return int(value / 60 * 4.7)
+    return value
 
 class Targets:
-    def __init__(self, player: Player):
-        self.player = player
-        self.bot = self.player.parent.cog.bot
+    def __init__(self, owner: Player | Guild):
+        self.owner = owner
+        self.bot = self.owner.parent.cog.bot
     
     @property
     def raw_targets(self) -> list[dict]:
-        return self.player.data.get("targets", [])
+        return self.owner.data.get("targets", [])
 
     async def get_target(self, index: int) -> discord.TextChannel | discord.DMChannel | None:
         data = self.raw_targets[index]
 
-        type = data.get("type", 0)
+        return await self.owner.parent.cog.resolve_target(
+            data.get("type", 0),
+            data["id"],
+        )
 
-        if type == 0: # normal text channel
-            textchannel = self.bot.get_channel(data["id"])
-            if textchannel is not None:
-                return textchannel
-            else:
-                return None
-        elif type == 1: # direct message (using the user ID)
-            user = self.bot.get_user(data["id"])
-            if user is None:
-                try:
-                    user = await self.bot.fetch_user(data["id"])
-                except discord.NotFound:
-                    return None
-            
-            return user.dm_channel
+    def add_target(self, type: int, id: int, digest: int = DIGEST_OFF) -> bool:
+        """Adds a target, returns False if it is already a target.
+        The digest mode of an existing target is updated.
+        """
+        for target in self.raw_targets:
+            if target.get("id") == id:
+                target["digest"] = digest
+                return False
+        
+        self.owner.data["targets"] = self.raw_targets + [
+            {"type": type, "id": id, "digest": digest}
+        ]
+        # the channel may have been cached as missing before being subscribed
+        self.owner.parent.cog.targets_cache.invalidate((type, id))
+        self.owner.targets_changed()
+        return True
+    
+    def remove_target(self, id: int) -> bool:
+        """Removes a target, returns False if it was not a target."""
+        targets = [target for target in self.raw_targets if target.get("id") != id]
+        if len(targets) == len(self.raw_targets):
+            return False
+        
+        self.owner.data["targets"] = targets
+        self.owner.targets_changed()
+        return True
 
     async def __aiter__(
         self
     ) -> Generator[Union[discord.TextChannel, discord.DMChannel]]:
+        async for _, target in self.items():
+            yield target
+
+    async def items(
+        self
+    ) -> Generator[tuple[dict, Union[discord.TextChannel, discord.DMChannel]]]:
+        """Yields the raw data of every target with the target, and removes
+        the invalid targets."""
         failed = []
 
         for n in range(len(self.raw_targets)):
-            target = await self.get_target(n)
+            try:
+                target = await self.get_target(n)
+            except discord.HTTPException as e: # may work next time
+                logging.warn(f"Cannot resolve the target {self.raw_targets[n]['id']}: {e}")
+                continue
             if target is None:
                 failed.append(n)
             else:
-                yield target
+                yield self.raw_targets[n], target
         
         # remove all invalids targets
         for n in sorted(failed, reverse=True):
-            del self.player.data.get("targets", [])[n]
+            del self.owner.data.get("targets", [])[n]
+        
+        if len(failed) > 0:
+            self.owner.targets_changed()
 
 class Class:
     def __init__(self, data: dict):
@@ -173,6 +249,19 @@ class Stats:
             classes.append(Class(class_))
         
         return classes
+    
+    @property
+    def history_values(self) -> dict[str, int]:
+        """The values recorded in the history of the player"""
+        values = {
+            "total_levels": self.total_levels,
+            "playtime": self.get("meta.playtime"),
+            "mob_kills": self.total_mob_kills,
+        }
+        for class_id, class_ in (self.get("characters") or {}).items():
+            values[f"class.{class_id}"] = Class(class_).total_level
+        
+        return {field: value for field, value in values.items() if value is not None}
 
 class Player:
     def __init__(self, data: dict, parent: Players):
@@ -184,6 +273,9 @@ class Player:
     def load_stats(self):
         self.stats = Stats(self.data.get("stats", {}))
     
+    def targets_changed(self):
+        self.parent.leaderboards.update_player(self)
+    
     @property
     def name(self) -> str | None:
         return self.data.get("name", self.uuid)
@@ -214,40 +306,62 @@ class Player:
     def next_fetch(self) -> datetime.datetime:
         if self.last_fetched is not None:
             return datetime.datetime.utcfromtimestamp(
-                self.last_fetched.timestamp() + PLAYER_CACHE_TIME,
+                self.last_fetched.timestamp() + self.parent.cog.bot.config.player_cache_time,
             )
         else:
             return None
     
-    def refresh(self):
-        """Refreshes the player data.
-        If new data cannot be fetched (which means no new data can be fetched
-        from the API because of the cache), the function does nothing.
+    @property
+    def needs_refresh(self) -> bool:
+        """Whether new data can be fetched from the API"""
+        return self.next_fetch is None or self.next_fetch <= datetime.datetime.utcnow()
+    
+    @property
+    def stale(self) -> bool:
+        """Whether the last refresh failed, the stats may be outdated"""
+        return self.data.get("stale", False)
+    
+    def fetch_stats(self) -> dict:
+        """Fetches the stats of the player from the API without modifying
+        the player, so it can safely be run in another thread.
+        Raises:
+          ValueError when the player doesn't exists.
+          APIError when the API is unavailable.
         """
-        if self.next_fetch is None or self.next_fetch <= datetime.datetime.utcnow(): # only refresh if new data are available
-            identifier = self.uuid or self.name
-            try:
-                # the response contains metadata and the data is in a list
-                raw_stats = wynncraft.Player.stats(identifier)
-            except urllib.error.HTTPError:
-                raise ValueError("The username or UUID is invalid")
-            else:
-                stats = raw_stats["data"][0]
-                self.data["stats"] = stats
-                self.data["name"] = stats.get("username")
-                self.data["uuid"] = stats.get("uuid")
-                self.last_fetched = datetime.datetime.utcfromtimestamp(
-                    raw_stats.get(
-                        "timestamp"
-                    ) / 1000 # the timestamp is in milliseconds
-                ) # this is the correct value to calculate the next update
-                self.load_stats()
-                logging.info(f"Player {self.name} refreshed")
+        identifier = self.uuid or self.name
+        try:
+            # the response contains metadata and the data is in a list
+            return self.parent.cog.api.call(wynncraft.Player.stats, identifier)
+        except NotFoundError:
+            raise ValueError("The username or UUID is invalid")
+    
+    def update_stats(self, raw_stats: dict):
+        """Updates the player with the stats returned by `fetch_stats`."""
+        stats = raw_stats["data"][0]
+        self.data["stats"] = stats
+        self.data.pop("stale", None)
+        self.data["name"] = stats.get("username")
+        self.data["uuid"] = stats.get("uuid")
+        self.last_fetched = datetime.datetime.utcfromtimestamp(
+            raw_stats.get(
+                "timestamp"
+            ) / 1000 # the timestamp is in milliseconds
+        ) # this is the correct value to calculate the next update
+        self.load_stats()
+        self.parent.history.record(
+            self.uuid,
+            raw_stats["timestamp"] // 1000, # in milliseconds
+            self.stats.history_values,
+        )
+        self.parent.leaderboards.update_player(self)
+        logging.info(f"Player {self.name} refreshed")
     
     def get_embed(self) -> discord.Embed:
         description = f"**Total levels** {self.stats.total_levels}\n"
         description += f"**Total playtime** {convert_timedelta(self.stats.total_playtime)}\n"
         description += f"**Guild** {self.stats.guild_name or 'No guild'}"
+        if self.stale:
+            description += "\n\n*The Wynncraft API is unavailable, these stats may be outdated.*"
 
         embed = discord.Embed(
             title=self.name,
@@ -291,38 +405,91 @@ class Player:
         return embed
 
 
-class Players(Storage):
-    players: list[Player]
-    data: list[dict]
+class Leaderboards:
+    boards: dict[tuple[str, int | None], Leaderboard]
 
-    def __init__(self, cog: Wynncraft):
-        super().__init__("./players.json", default=[])
-        self.cog = cog
+    def __init__(self):
+        """Leaderboards of the players for every stat of `STATS_NAMES`, either
+        global (scope `None`) or restricted to the players subscribed in a
+        channel (scope is the channel ID).
+        """
+        self.boards = {}
+        self.scopes = {} # the scopes each player is in, by UUID
+        self.players = {} # by UUID
     
-    def new_player(self, name_or_uuid: str) -> Player:
-        """Fetch and create a new player in the database.
-        Returns the value from the database if the player is already in it.
+    def get_board(self, stat: str, scope: int | None = None) -> Leaderboard:
+        board = self.boards.get((stat, scope))
+        if board is None:
+            board = Leaderboard()
+            self.boards[(stat, scope)] = board
+        return board
+    
+    def update_player(self, player: Player):
+        """Updates the stats and the scopes of the player in the leaderboards.
+        Called when the player is refreshed or when its targets change.
         """
+        if player.uuid is None:
+            return
         
-        for player in self.players:
-            if player.name == name_or_uuid or player.uuid == name_or_uuid: # the user has already been fetched
-                return player
-
-        logging.info(f"Fetching the new user `{name_or_uuid}`")
-
-        player = Player({"uuid": name_or_uuid}, self) # for now the field being name or uuid doesn't matters, it will be overwritten when fetched
-
-        try:
-            player.refresh()
-        except ValueError: # the username or UUID is invalid
-            raise ValueError("The player name or UUID is invalid or the player doesn't exists.")
+        values = player.stats.history_values
+        scopes = {None} | {
+            target["id"] for target in player.targets.raw_targets
+            if target.get("type", 0) == 0 # text channel
+        }
 
-        self.add_player(player) # we don't need to handle the "already exist error" as the check as already been done
-
-        self.save()
+        for scope in self.scopes.get(player.uuid, set()) - scopes:
+            for stat in STATS_NAMES:
+                self.get_board(stat, scope).remove(player.uuid)
+        
+        for scope in scopes:
+            for stat in STATS_NAMES:
+                if values.get(stat) is not None:
+                    self.get_board(stat, scope).update(player.uuid, values[stat])
+        
+        self.scopes[player.uuid] = scopes
+        self.players[player.uuid] = player
+    
+    def remove_player(self, player: Player):
+        for scope in self.scopes.pop(player.uuid, set()):
+            for stat in STATS_NAMES:
+                self.get_board(stat, scope).remove(player.uuid)
+        self.players.pop(player.uuid, None)
+    
+    def top(
+        self,
+        stat: str,
+        count: int,
+        scope: int | None = None,
+    ) -> list[tuple[Player, int]]:
+        return [
+            (self.players[uuid], value)
+            for uuid, value in self.get_board(stat, scope).top(count)
+        ]
+    
+    def rank(
+        self,
+        player: Player,
+        stat: str,
+        scope: int | None = None,
+    ) -> tuple[int | None, int]:
+        """Returns the rank of the player and the number of ranked players."""
+        board = self.get_board(stat, scope)
+        return board.rank(player.uuid), len(board)
 
-        return player
+class Players(Storage):
+    players: list[Player]
+    data: list[dict]
 
+    def __init__(self, cog: Wynncraft):
+        super().__init__(
+            cog.bot.config.players_file,
+            default=[],
+            codec=get_codec(cog.bot.config.storage_codec),
+        )
+        self.cog = cog
+        self.history = HistoryStore(cog.bot.config.history_directory)
+        self.leaderboards = Leaderboards()
+    
     def add_player(self, player: Player):
         for player_ in self.data:
             if player_.get("uuid") == player.uuid:
@@ -330,6 +497,12 @@ class Players(Storage):
 
         self.data.append(player.data)
         self.players.append(player)
+        self.leaderboards.update_player(player)
+    
+    def remove_player(self, player: Player):
+        self.data.remove(player.data)
+        self.players.remove(player)
+        self.leaderboards.remove_player(player)
     
     def get_player(self, name_or_uuid: str) -> Player | None:
         """Returns a player by name or UUID if he is already fetched in the database."""
@@ -339,9 +512,12 @@ class Players(Storage):
 
     def load_players(self):
         players = []
+        self.leaderboards = Leaderboards()
 
         for player in self.data:
-            players.append(Player(player, self))
+            player = Player(player, self)
+            players.append(player)
+            self.leaderboards.update_player(player)
         
         self.players = players
     
@@ -357,6 +533,256 @@ class Players(Storage):
     def __iter__(self):
         return iter(self.players)
 
+def split_lines(lines: list[str], limit: int = MESSAGE_LIMIT) -> list[str]:
+    """Joins the lines in as few messages as possible, every message is at
+    most `limit` characters long. The lines are never split, except the lines
+    too long for a message which are shortened.
+    """
+    messages = []
+    current = None
+
+    for line in lines:
+        if len(line) > limit:
+            line = line[:limit - 1] + "…"
+        if current is not None and len(current) + 1 + len(line) <= limit:
+            current += "\n" + line
+        else:
+            if current is not None:
+                messages.append(current)
+            current = line
+    
+    if current is not None:
+        messages.append(current)
+    return messages
+
+class Digest:
+    events: list[str]
+
+    def __init__(self, channel: discord.TextChannel | discord.DMChannel):
+        """The notifications waiting to be sent in a channel in digest mode."""
+        self.channel = channel
+        self.mode = DIGEST_MESSAGE
+        self.events = []
+        self.started = None
+        self.message = None # the last digest sent in the channel
+    
+    def add(self, event: str):
+        if len(self.events) == 0:
+            self.started = datetime.datetime.utcnow()
+        # one line per item, so the sent events can be counted in a message
+        self.events.extend(
+            f"<t:{int(datetime.datetime.now().timestamp())}:t> {event}".split("\n")
+        )
+    
+    def is_due(self, window: int) -> bool:
+        return len(self.events) > 0 and (
+            datetime.datetime.utcnow() - self.started
+        ).total_seconds() >= window
+    
+    async def flush(self):
+        """Sends the waiting notifications in as few messages as possible, or
+        in an edit of the previous digest if it is still the last message of
+        the channel and everything fits in it.
+        The notifications are only removed once they have been sent, so they
+        are sent again next time if it fails.
+        """
+        if (
+            self.mode == DIGEST_EDIT
+            and self.message is not None
+            # DM channels don't know their last message
+            and getattr(self.channel, "last_message_id", None) == self.message.id
+        ):
+            contents = split_lines([self.message.content] + self.events)
+            if len(contents) == 1:
+                try:
+                    self.message = await self.message.edit(content=contents[0])
+                    self.events = []
+                    return
+                except discord.NotFound: # the message has been deleted
+                    pass
+        
+        for content in split_lines(self.events):
+            self.message = await self.channel.send(content=content)
+            del self.events[:content.count("\n") + 1]
+
+def fetch_online_players(api: APIClient) -> dict[str, str]:
+    """Returns the server of every online player, by name, in one request."""
+    raw_servers = api.call(wynncraft.Network.server_list)
+
+    online_players = {}
+    for server, players in raw_servers.items():
+        if isinstance(players, list): # skip the request metadata
+            for name in players:
+                online_players[name] = server
+    
+    return online_players
+
+class Guild:
+    def __init__(self, data: dict, parent: Guilds):
+        self.data = data
+        self.parent = parent
+        self.targets = Targets(self)
+    
+    def targets_changed(self):
+        pass
+    
+    @property
+    def name(self) -> str:
+        return self.data.get("name")
+    
+    @property
+    def prefix(self) -> str | None:
+        return self.data.get("prefix")
+    
+    @property
+    def members(self) -> dict[str, str]:
+        """The rank of every member, by name"""
+        return self.data.get("members", {})
+    
+    @property
+    def online_members(self) -> dict[str, str]:
+        """The server of every online member, by name"""
+        return self.data.get("online", {})
+    
+    @property
+    def last_fetched(self) -> datetime.datetime:
+        last_timestamp = self.data.get("last_fetched")
+        if last_timestamp is not None:
+            return datetime.datetime.utcfromtimestamp(last_timestamp)
+        else:
+            return None
+    @last_fetched.setter
+    def last_fetched(self, new_date: datetime.datetime):
+        self.data["last_fetched"] = int(new_date.timestamp())
+    @property
+    def next_fetch(self) -> datetime.datetime:
+        if self.last_fetched is not None:
+            return datetime.datetime.utcfromtimestamp(
+                self.last_fetched.timestamp() + self.parent.cog.bot.config.guild_cache_time,
+            )
+        else:
+            return None
+    
+    @property
+    def needs_refresh(self) -> bool:
+        return self.next_fetch is None or self.next_fetch <= datetime.datetime.utcnow()
+    
+    def fetch_roster(self) -> dict:
+        """Fetches the guild from the API without modifying it, so it can
+        safely be run in another thread.
+        Raises:
+          ValueError when the guild doesn't exists.
+          APIError when the API is unavailable.
+        """
+        try:
+            raw_guild = self.parent.cog.api.call(wynncraft.Guild.stats, self.name)
+        except NotFoundError:
+            raise ValueError("The guild name is invalid")
+        if "error" in raw_guild:
+            raise ValueError("The guild name is invalid")
+        
+        return raw_guild
+    
+    def update_roster(self, raw_guild: dict) -> tuple[list[str], list[str]]:
+        """Updates the guild with the data returned by `fetch_roster`.
+        Returns the names of the members who joined and left the guild.
+        """
+        members = {
+            member["name"]: member.get("rank")
+            for member in raw_guild.get("members", [])
+        }
+        joined = [name for name in members if name not in self.members]
+        left = [name for name in self.members if name not in members]
+
+        first_fetch = self.last_fetched is None
+        self.data["name"] = raw_guild.get("name", self.name)
+        self.data["prefix"] = raw_guild.get("prefix")
+        self.data["members"] = members
+        self.last_fetched = datetime.datetime.utcnow()
+        logging.info(f"Guild {self.name} refreshed")
+
+        if first_fetch:
+            return [], []
+        return joined, left
+    
+    def update_online(self, online_players: dict[str, str]) -> tuple[list[str], list[str]]:
+        """Updates the online members from the list of every online player.
+        Returns the names of the members who logged in and out.
+        """
+        online = {
+            name: server for name, server in online_players.items()
+            if name in self.members
+        }
+        first_update = "online" not in self.data
+        logged_in = [name for name in online if name not in self.online_members]
+        logged_out = [name for name in self.online_members if name not in online]
+
+        self.data["online"] = online
+        if first_update:
+            return [], []
+        return logged_in, logged_out
+    
+    def get_embed(self) -> discord.Embed:
+        title = self.name
+        if self.prefix is not None:
+            title += f" [{self.prefix}]"
+        
+        description = f"**Members** {len(self.members)}\n"
+        description += f"**Online** {len(self.online_members)}"
+
+        embed = discord.Embed(
+            title=title,
+            description=description,
+            color=12233344, # wynncraft website background
+        )
+
+        if len(self.online_members) > 0:
+            embed.add_field(
+                name="Online members",
+                value="\n".join(
+                    f"{name} (`{server}`)"
+                    for name, server in sorted(self.online_members.items())
+                )[:1024],
+            )
+        
+        return embed
+
+class Guilds(Storage):
+    guilds: list[Guild]
+    data: list[dict]
+
+    def __init__(self, cog: Wynncraft):
+        super().__init__(cog.bot.config.guilds_file, default=[])
+        self.cog = cog
+    
+    def add_guild(self, guild: Guild):
+        self.data.append(guild.data)
+        self.guilds.append(guild)
+    
+    def get_guild(self, name: str) -> Guild | None:
+        for guild in self.guilds:
+            if guild.name.lower() == name.lower():
+                return guild
+    
+    def remove_guild(self, guild: Guild):
+        self.data.remove(guild.data)
+        self.guilds.remove(guild)
+    
+    def load_guilds(self):
+        self.guilds = [Guild(guild, self) for guild in self.data]
+    
+    def load(self):
+        super().load()
+        self.load_guilds()
+    
+    def load_or_empty(self):
+        super().load_or_empty()
+        if not hasattr(self, "guilds"):
+            self.guilds = []
+    
+    def __iter__(self):
+        return iter(self.guilds)
+
 class PlayerCommandGroup(app_commands.Group):
     players: Players
 
@@ -392,6 +818,146 @@ class PlayerCommandGroup(app_commands.Group):
                 embed=player.get_large_embed(),
             )
 
+    @app_commands.command(
+        name="history",
+        description="Show the progression of a player.",
+    )
+    @app_commands.describe(
+        name="The player to lookup",
+        stat="The statistic to show",
+        days="The number of days to show",
+    )
+    @app_commands.choices(
+        stat=[
+            app_commands.Choice(name=stat_name, value=field)
+            for field, stat_name in STATS_NAMES.items()
+        ],
+    )
+    async def history(
+        self,
+        inter: discord.Interaction,
+        name: str,
+        stat: app_commands.Choice[str],
+        days: app_commands.Range[int, 1, 365] = 30,
+    ):
+        player = self.players.get_player(name)
+        if player is None: # player not in database
+            await inter.response.send_message(f"I don't know the player `{name}`.")
+            return
+        
+        start = int(time.time()) - days * 24 * 3600
+        try:
+            rows = self.players.history.get(player.uuid).downsample(
+                stat.value,
+                HISTORY_POINTS,
+                start=start,
+            )
+        except KeyError: # the field has never been recorded
+            rows = []
+        
+        if len(rows) == 0:
+            await inter.response.send_message(
+                f"I have no history for the player `{player.name}` in the last {days} days."
+            )
+            return
+        
+        values = [convert_stat(stat.value, value) for _, value in rows]
+        
+        embed = discord.Embed(
+            title=f"{player.name} - {stat.name}",
+            description=f"`{convert_sparkline(values)}`",
+            color=12233344, # wynncraft website background
+        )
+        embed.add_field(name="From", value=f"{values[0]:,} <t:{rows[0][0]}:R>")
+        embed.add_field(name="To", value=f"{values[-1]:,} <t:{rows[-1][0]}:R>")
+        embed.add_field(name="Progression", value=f"{values[-1] - values[0]:+,}")
+        embed.set_thumbnail(url=f"https://visage.surgeplay.com/bust/{player.uuid}")
+
+        await inter.response.send_message(embed=embed)
+
+    @app_commands.command(
+        name="top",
+        description="Show the best tracked players.",
+    )
+    @app_commands.describe(
+        stat="The statistic used to rank the players",
+        channel="Only rank the players subscribed in this channel",
+    )
+    @app_commands.choices(
+        stat=[
+            app_commands.Choice(name=stat_name, value=field)
+            for field, stat_name in STATS_NAMES.items()
+        ],
+    )
+    async def top(
+        self,
+        inter: discord.Interaction,
+        stat: app_commands.Choice[str],
+        channel: discord.TextChannel = None,
+    ):
+        scope = channel.id if channel is not None else None
+        top = self.players.leaderboards.top(stat.value, LEADERBOARD_SIZE, scope)
+
+        if len(top) == 0:
+            await inter.response.send_message("There is no player to rank.")
+            return
+        
+        description = ""
+        for player, value in top:
+            rank, _ = self.players.leaderboards.rank(player, stat.value, scope)
+            description += f"**{rank}.** {player.name} - {convert_stat(stat.value, value):,}\n"
+        
+        title = f"Top {stat.name.lower()}"
+        if channel is not None:
+            title += f" in #{channel.name}"
+        
+        await inter.response.send_message(
+            embed=discord.Embed(
+                title=title,
+                description=description,
+                color=12233344, # wynncraft website background
+            )
+        )
+
+    @app_commands.command(
+        name="rank",
+        description="Show the rank of a player among the tracked players.",
+    )
+    @app_commands.describe(
+        name="The player to lookup",
+        stat="The statistic used to rank the players",
+        channel="Only rank the players subscribed in this channel",
+    )
+    @app_commands.choices(
+        stat=[
+            app_commands.Choice(name=stat_name, value=field)
+            for field, stat_name in STATS_NAMES.items()
+        ],
+    )
+    async def rank(
+        self,
+        inter: discord.Interaction,
+        name: str,
+        stat: app_commands.Choice[str],
+        channel: discord.TextChannel = None,
+    ):
+        player = self.players.get_player(name)
+        if player is None: # player not in database
+            await inter.response.send_message(f"I don't know the player `{name}`.")
+            return
+        
+        scope = channel.id if channel is not None else None
+        rank, count = self.players.leaderboards.rank(player, stat.value, scope)
+
+        if rank is None:
+            await inter.response.send_message(
+                f"The player `{player.name}` is not ranked here."
+            )
+        else:
+            await inter.response.send_message(
+                f"`{player.name}` is ranked **{rank}** out of {count} for the {stat.name.lower()}."
+            )
+
     @app_commands.command(
         name="subscribe",
         description="Send notifications somewhere when the player logs in.",
@@ -399,17 +965,20 @@ class PlayerCommandGroup(app_commands.Group):
     @app_commands.describe(
         name="The name of the player to follow.",
         channel="The channel targeted by the notifications.",
-        dm="Set to true to receive notifications in direct messages."
+        dm="Set to true to receive notifications in direct messages.",
+        digest="Merge the notifications sent close to each other.",
     )
+    @app_commands.choices(digest=DIGEST_CHOICES)
     async def subscribe(
         self,
         inter: discord.Interaction,
         name: str,
         channel: discord.TextChannel = None,
         dm: bool = False,
+        digest: app_commands.Choice[int] = None,
     ):
         if channel is None and dm is False:
-            await inter.response.send(":x: Specify at least one target (channel or DM).")
+            await inter.response.send_message(":x: Specify at least one target (channel or DM).")
             return
         
         await inter.response.defer()
@@ -422,31 +991,17 @@ class PlayerCommandGroup(app_commands.Group):
             )
             return
         
-        new_targets = []
-
         targets_strings = []
+        digest_mode = digest.value if digest is not None else DIGEST_OFF
         
         if channel is not None:
-            if channel.id not in (target.get("id") for target in player.targets.raw_targets):
-                new_targets.append(
-                    {
-                        "type": 0, # text channel
-                        "id": channel.id,
-                    }
-                )
+            player.targets.add_target(0, channel.id, digest_mode) # text channel
             targets_strings.append(f"in the channel {channel.mention}")
 
         if dm:
-            if inter.user.id not in (target.get("id") for target in player.targets.raw_targets):
-                new_targets.append(
-                    {
-                        "type": 1, # dm channel
-                        "id": inter.user.id,
-                    }
-                )
+            player.targets.add_target(1, inter.user.id, digest_mode) # dm channel
             targets_strings.append(f"in your DMs")
         
-        player.data["targets"] = player.targets.raw_targets + new_targets
         self.players.save()
 
         targets_string = " and ".join(targets_strings)
@@ -455,6 +1010,170 @@ class PlayerCommandGroup(app_commands.Group):
             content=f"The notifications will be send {targets_string}!"
         )
     
+    async def read_names(
+        self,
+        names: str | None,
+        names_file: discord.Attachment | None,
+    ) -> list[str]:
+        """Returns the player names from the command option and the attached
+        file, separated by spaces, commas or new lines."""
+        raw_names = names or ""
+        if names_file is not None:
+            raw_names += "\n" + (await names_file.read()).decode("utf-8", errors="ignore")
+        
+        return [name for name in re.split(r"[\s,;]+", raw_names) if name != ""]
+
+    def get_new_targets(
+        self,
+        inter: discord.Interaction,
+        channel: discord.TextChannel | None,
+        dm: bool,
+    ) -> list[tuple[int, int]]:
+        targets = []
+        if channel is not None:
+            targets.append((0, channel.id)) # text channel
+        if dm:
+            targets.append((1, inter.user.id)) # dm channel
+        return targets
+
+    def save_targets(
+        self,
+        old_targets: list[tuple[Player, list[dict]]],
+        new_players: list[Player] = [],
+    ) -> bool:
+        """Saves the players once all the targets have been changed.
+        If the players cannot be saved, the targets are reverted to
+        `old_targets`, the players in `new_players` are removed and False is
+        returned.
+        """
+        try:
+            self.players.save()
+        except OSError:
+            for player, targets in old_targets:
+                player.data["targets"] = targets
+                player.targets_changed()
+            for player in new_players:
+                self.players.remove_player(player)
+            logging.exception("Cannot save the players")
+            return False
+        return True
+
+    @app_commands.command(
+        name="bulksubscribe",
+        description="Send notifications somewhere when any of the players logs in.",
+    )
+    @app_commands.describe(
+        names="The names of the players to follow, separated by spaces or commas.",
+        names_file="A text file with the names of the players to follow.",
+        channel="The channel targeted by the notifications.",
+        dm="Set to true to receive notifications in direct messages.",
+        digest="Merge the notifications sent close to each other.",
+    )
+    @app_commands.choices(digest=DIGEST_CHOICES)
+    async def bulk_subscribe(
+        self,
+        inter: discord.Interaction,
+        names: str = None,
+        names_file: discord.Attachment = None,
+        channel: discord.TextChannel = None,
+        dm: bool = False,
+        digest: app_commands.Choice[int] = None,
+    ):
+        if channel is None and dm is False:
+            await inter.response.send_message(":x: Specify at least one target (channel or DM).")
+            return
+        
+        await inter.response.defer(thinking=True)
+
+        names = await self.read_names(names, names_file)
+        if len(names) == 0:
+            await inter.edit_original_response(content=":x: Specify at least one player.")
+            return
+        if len(names) > BULK_MAX_PLAYERS:
+            await inter.edit_original_response(
+                content=f":x: You can only subscribe to {BULK_MAX_PLAYERS} players at once."
+            )
+            return
+        
+        players, not_found, new_players = await self.cog.get_players(names)
+
+        # apply every change, then save once, the changes are reverted if the
+        # database cannot be saved
+        old_targets = [
+            (player, [target.copy() for target in player.targets.raw_targets])
+            for player in players
+        ]
+        subscribed = 0
+        digest_mode = digest.value if digest is not None else DIGEST_OFF
+        for player in players:
+            added = False
+            for type, id in self.get_new_targets(inter, channel, dm):
+                added = player.targets.add_target(type, id, digest_mode) or added
+            subscribed += added
+        
+        if not self.save_targets(old_targets, new_players):
+            await inter.edit_original_response(content=":x: I could not save the subscriptions.")
+            return
+        
+        message = f"I subscribed to {subscribed} new players ({len(players) - subscribed} already subscribed)."
+        if len(not_found) > 0:
+            message += "\n:confused: I found no user named " + ", ".join(f"`{name}`" for name in not_found)
+        
+        await inter.edit_original_response(content=message[:2000])
+
+    @app_commands.command(
+        name="bulkunsubscribe",
+        description="Remove the notifications of several players in a channel.",
+    )
+    @app_commands.describe(
+        names="The names of the players to unsubscribe, separated by spaces or commas.",
+        names_file="A text file with the names of the players to unsubscribe.",
+        channel="Unsubscribe this channel",
+        dm="Set to true to unsubscribe you from notifications",
+    )
+    async def bulk_unsubscribe(
+        self,
+        inter: discord.Interaction,
+        names: str = None,
+        names_file: discord.Attachment = None,
+        channel: discord.TextChannel = None,
+        dm: bool = False,
+    ):
+        if channel is None and dm is False:
+            await inter.response.send_message("Specify a channel or a DM channel.")
+            return
+        
+        await inter.response.defer(thinking=True)
+
+        names = await self.read_names(names, names_file)
+
+        players = []
+        not_found = []
+        for name in dict.fromkeys(names): # remove duplicates
+            player = self.players.get_player(name)
+            if player is None:
+                not_found.append(name)
+            elif player not in players:
+                players.append(player)
+        
+        old_targets = [(player, player.targets.raw_targets) for player in players]
+        unsubscribed = 0
+        for player in players:
+            removed = False
+            for _, id in self.get_new_targets(inter, channel, dm):
+                removed = player.targets.remove_target(id) or removed
+            unsubscribed += removed
+        
+        if not self.save_targets(old_targets):
+            await inter.edit_original_response(content=":x: I could not save the subscriptions.")
+            return
+        
+        message = f"I unsubscribed from {unsubscribed} players."
+        if len(not_found) > 0:
+            message += "\nNothing is subscribed to " + ", ".join(f"`{name}`" for name in not_found)
+        
+        await inter.edit_original_response(content=message[:2000])
+
     @app_commands.command(
         name="unsubscribe",
         description="Remove player notification in a channel.",
@@ -497,6 +1216,7 @@ class PlayerCommandGroup(app_commands.Group):
         for i in sorted(to_remove_targets_index, reverse=True):
             del player.data["targets"][i]
         
+        player.targets_changed()
         self.players.save()
         
         if len(removed_targets) > 0:
@@ -583,6 +1303,8 @@ class PlayerCommandGroup(app_commands.Group):
         )
 
     @forget.autocomplete("name")
+    @history.autocomplete("name")
+    @rank.autocomplete("name")
     @unsubscribe.autocomplete("name")
     @subscribed.autocomplete("name")
     async def fetched_player_autocomplete(
@@ -631,6 +1353,191 @@ class PlayerCommandGroup(app_commands.Group):
         
         return choices
 
+class GuildCommandGroup(app_commands.Group):
+    guilds: Guilds
+
+    def __init__(self, bot: Client, cog: Wynncraft):
+        super().__init__(
+            name="guilds",
+            description="Manage tracked guilds",
+        )
+        self.bot = bot
+        self.cog = cog
+        self.guilds = self.cog.guilds
+    
+    @app_commands.command(
+        name="show",
+        description="Show the members of a tracked guild.",
+    )
+    @app_commands.describe(
+        name="The guild to lookup",
+    )
+    async def show(
+        self,
+        inter: discord.Interaction,
+        name: str,
+    ):
+        guild = self.guilds.get_guild(name)
+        if guild is None:
+            await inter.response.send_message(f"I don't track the guild `{name}`.")
+            return
+        
+        await inter.response.send_message(embed=guild.get_embed())
+
+    @app_commands.command(
+        name="subscribe",
+        description="Send notifications somewhere when the members of a guild log in.",
+    )
+    @app_commands.describe(
+        name="The name of the guild to follow.",
+        channel="The channel targeted by the notifications.",
+        dm="Set to true to receive notifications in direct messages.",
+        digest="Merge the notifications sent close to each other.",
+    )
+    @app_commands.choices(digest=DIGEST_CHOICES)
+    async def subscribe(
+        self,
+        inter: discord.Interaction,
+        name: str,
+        channel: discord.TextChannel = None,
+        dm: bool = False,
+        digest: app_commands.Choice[int] = None,
+    ):
+        if channel is None and dm is False:
+            await inter.response.send_message(":x: Specify at least one target (channel or DM).")
+            return
+        
+        await inter.response.defer()
+
+        guild = await self.cog.get_guild(name)
+        if guild is None:
+            await inter.edit_original_response(
+                content=f":confused: I found no guild named `{name}`..."
+            )
+            return
+        
+        targets_strings = []
+        digest_mode = digest.value if digest is not None else DIGEST_OFF
+        if channel is not None:
+            guild.targets.add_target(0, channel.id, digest_mode) # text channel
+            targets_strings.append(f"in the channel {channel.mention}")
+        if dm:
+            guild.targets.add_target(1, inter.user.id, digest_mode) # dm channel
+            targets_strings.append("in your DMs")
+        
+        self.guilds.save()
+
+        targets_string = " and ".join(targets_strings)
+        await inter.edit_original_response(
+            content=f"The notifications for the guild `{guild.name}` will be send {targets_string}!"
+        )
+    
+    @app_commands.command(
+        name="unsubscribe",
+        description="Remove guild notifications in a channel.",
+    )
+    @app_commands.describe(
+        name="The name of the guild to unsubscribe.",
+        channel="Unsubscribe this channel",
+        dm="Set to true to unsubscribe you from notifications",
+    )
+    async def unsubscribe(
+        self,
+        inter: discord.Interaction,
+        name: str,
+        channel: discord.TextChannel = None,
+        dm: bool = False,
+    ):
+        if channel is None and dm is False:
+            await inter.response.send_message("Specify a channel or a DM channel.")
+            return
+        
+        guild = self.guilds.get_guild(name)
+        if guild is None:
+            await inter.response.send_message(f"Nothing is subscribed to the guild `{name}`.")
+            return
+        
+        removed_targets = []
+        if channel is not None and guild.targets.remove_target(channel.id):
+            removed_targets.append(f"the channel {channel.mention}")
+        if dm and guild.targets.remove_target(inter.user.id):
+            removed_targets.append("your DM")
+        
+        if len(guild.targets.raw_targets) == 0: # nobody follows the guild anymore
+            self.guilds.remove_guild(guild)
+        
+        self.guilds.save()
+
+        if len(removed_targets) > 0:
+            removed_targets_string = " and ".join(removed_targets)
+            await inter.response.send_message(
+                f"I successfully unsubscribed {removed_targets_string}!",
+            )
+        else:
+            await inter.response.send_message(
+                f"The specified targets where not subscribed."
+            )
+
+    @show.autocomplete("name")
+    @unsubscribe.autocomplete("name")
+    async def tracked_guild_autocomplete(
+        self,
+        inter: discord.Interaction,
+        current: str,
+    ) -> list[app_commands.Choice(str)]:
+        choices = []
+
+        for guild in self.guilds:
+            if current.lower() in guild.name.lower():
+                choices.append(
+                    app_commands.Choice(
+                        name=guild.name,
+                        value=guild.name,
+                    )
+                )
+        
+        return choices
+
+class AdminCommandGroup(app_commands.Group):
+    def __init__(self, bot: Client, cog: Wynncraft):
+        super().__init__(
+            name="admin",
+            description="Tools for the owner of the bot",
+        )
+        self.bot = bot
+        self.cog = cog
+    
+    async def interaction_check(self, inter: discord.Interaction) -> bool:
+        if not await self.bot.is_owner(inter.user):
+            await self.bot.send_error(inter, "Only the owner of the bot can use this command.")
+            return False
+        return True
+    
+    @app_commands.command(
+        name="profile",
+        description="Profile the bot for a few seconds.",
+    )
+    @app_commands.describe(
+        seconds="The duration of the profiling",
+    )
+    async def profile(
+        self,
+        inter: discord.Interaction,
+        seconds: app_commands.Range[int, 1, 600] = 30,
+    ):
+        if self.cog.profiler.running:
+            await self.bot.send_error(inter, "A profiling is already running.")
+            return
+        
+        await inter.response.defer(thinking=True)
+
+        path, summary = await self.cog.profile(seconds)
+
+        await inter.edit_original_response(
+            content=f"```\n{summary[:1900]}\n```",
+            attachments=[discord.File(path)],
+        )
+
 class Wynncraft(commands.Cog):
     def __init__(
         self,
@@ -641,16 +1548,249 @@ class Wynncraft(commands.Cog):
         self.players = Players(self)
         self.players.load_or_empty()
 
+        self.guilds = Guilds(self)
+        self.guilds.load_or_empty()
+
+        self.digests: dict[int, Digest] = {} # by channel ID
+        self.api = APIClient()
+        self.profiler = SamplingProfiler()
+        self.targets_cache = TTLCache(TARGET_CACHE_TIME, NEGATIVE_TARGET_CACHE_TIME)
+        self.apply_configuration()
+
         self.player_commands = PlayerCommandGroup(self.bot, self)
         self.bot.tree.add_command(self.player_commands)
+        self.guild_commands = GuildCommandGroup(self.bot, self)
+        self.bot.tree.add_command(self.guild_commands)
+        self.admin_commands = AdminCommandGroup(self.bot, self)
+        self.bot.tree.add_command(self.admin_commands)
+    
+    async def cog_load(self):
+        self.watch_configuration.start()
+        if self.bot.config.emoji_guild is not None:
+            await self.load_emojis(self.bot.config.emoji_guild)
+    
+    async def cog_unload(self):
+        self.watch_configuration.cancel()
+        await self.flush_digests(force=True)
+    
+    def apply_configuration(self):
+        """Applies the tunable values of the configuration to the running
+        refresh loop, API client and storage."""
+        config = self.bot.config
+
+        if self.refresh.seconds != config.refresh_interval:
+            self.refresh.change_interval(seconds=config.refresh_interval)
+        
+        self.api.configure(config.api_concurrency, config.api_request_budget)
+
+        self.players.codec = get_codec(config.storage_codec)
+
+        self.move_storage(self.players, config.players_file, "players")
+        self.move_storage(self.guilds, config.guilds_file, "guilds")
+
+        if self.players.history.directory != config.history_directory:
+            logging.warn(
+                f"The history will be stored in {config.history_directory} after "
+                f"a restart, it is still stored in {self.players.history.directory}"
+            )
+    
+    def move_storage(self, storage: Storage, file: str, name: str):
+        """Saves `storage` to `file` from now on, unless the file already
+        exists: it is never overwritten."""
+        if storage.file == file:
+            return
+        
+        if os.path.exists(file):
+            logging.error(
+                f"Cannot move the {name} to {file}, the file already exists. "
+                f"The {name} are still saved in {storage.file}"
+            )
+        else:
+            logging.info(f"Moving the {name} to {file}")
+            storage.file = file
+            storage.save()
+    
+    async def profile(self, seconds: float) -> tuple[str, str]:
+        """Samples the running bot (refresh loop, commands and API calls) for
+        `seconds` seconds.
+        Returns the path of the report, in the collapsed stack format used by
+        flamegraphs, and a summary of the functions with the most samples.
+        """
+        logging.info(f"Profiling for {seconds} seconds")
+        self.profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            self.profiler.stop()
+        
+        os.makedirs(PROFILES_DIRECTORY, exist_ok=True)
+        path = os.path.join(
+            PROFILES_DIRECTORY,
+            f"profile-{datetime.datetime.now():%Y%m%d-%H%M%S}.txt",
+        )
+        self.profiler.write_collapsed(path)
+        logging.info(f"Profile written to {path}")
+
+        return path, self.profiler.get_summary(idle=PROFILE_IDLE_FRAMES)
+    
+    @tasks.loop(seconds=CONFIGURATION_WATCH_INTERVAL)
+    async def watch_configuration(self):
+        """Reloads the configuration when the file is modified, without
+        restarting the bot."""
+        if self.bot.config.has_changed() and self.bot.config.reload():
+            self.apply_configuration()
+    
+    async def load_emojis(self, guild_id: int):
+        """Rasterizes the class icons and creates the corresponding emojis in
+        the guild `guild_id`, the default emojis are used if it fails.
+        """
+        guild = self.bot.get_guild(guild_id)
+        if guild is None:
+            logging.warn(f"Cannot find the emoji guild {guild_id}, using default emojis")
+            return
+        
+        pipeline = AssetPipeline(sizes=(EMOJI_SIZE,))
+        try:
+            paths = await pipeline.build(
+                {name: CLASS_ICON_URL.format(name) for name in EMOJIS}
+            )
+            emojis = await pipeline.sync_emojis(
+                guild,
+                {name: sizes[EMOJI_SIZE] for name, sizes in paths.items()},
+            )
+        except Exception: # rasterizing can fail in many ways, the bot must start anyway
+            logging.exception("Cannot create the emojis, using default emojis")
+        else:
+            EMOJIS.update(emojis)
     
     async def get_player(self, name: str) -> Player | None:
+        """Returns the player from the database or fetches it outside of the
+        event loop, returns None if the player cannot be found."""
+        player = self.players.get_player(name)
+        if player is not None:
+            return player
+        
+        players, _, _ = await self.get_players([name])
+        if len(players) == 0:
+            return None
+        
+        self.players.save()
+        return players[0]
+    
+    async def resolve_target(
+        self,
+        type: int,
+        id: int,
+    ) -> discord.TextChannel | discord.DMChannel | None:
+        """Returns the channel to send the notifications of a target to, or
+        None if it doesn't exists anymore.
+        The results, including the missing channels, are cached so a target
+        doesn't cost any request for each notification.
+        Raises:
+          discord.HTTPException when the channel cannot be fetched for now.
+        """
+        found, channel = self.targets_cache.lookup((type, id))
+        if found:
+            return channel
+        
+        channel = None
+        if type == 0: # normal text channel
+            channel = self.bot.get_channel(id)
+        elif type == 1: # direct message (using the user ID)
+            user = self.bot.get_user(id)
+            if user is None:
+                try:
+                    user = await self.bot.fetch_user(id)
+                except discord.NotFound:
+                    user = None
+            if user is not None:
+                # the DM channel only exists once a message has been sent
+                channel = user.dm_channel or await user.create_dm()
+        
+        self.targets_cache.set((type, id), channel)
+        return channel
+    
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        self.targets_cache.set((0, channel.id), None)
+    
+    async def get_guild(self, name: str) -> Guild | None:
+        """Returns the guild from the database or fetches it outside of the
+        event loop, returns None if the guild cannot be found."""
+        guild = self.guilds.get_guild(name)
+        if guild is not None:
+            return guild
+        
+        guild = Guild({"name": name}, self.guilds)
         try:
-            return self.players.new_player(name) # the function returns the player from the database if it has already been fetched
-        except ValueError:
+            raw_guild = await asyncio.to_thread(guild.fetch_roster)
+        except (ValueError, APIError): # invalid guild or API unavailable
             return None
+        
+        existing_guild = self.guilds.get_guild(raw_guild.get("name", name))
+        if existing_guild is not None: # the name had another case
+            return existing_guild
+        
+        guild.update_roster(raw_guild)
+        self.guilds.add_guild(guild)
+        return guild
     
-    @tasks.loop(seconds=30) # the API fetch will only be done when the cache expires, so 30 seconds is fine
+    async def get_players(
+        self,
+        names: list[str],
+    ) -> tuple[list[Player], list[str], list[Player]]:
+        """Returns the players from the database or fetches them, the unknown
+        players are fetched concurrently and the database is not saved.
+        Returns the players found, the names that were not found and the
+        players added to the database.
+        """
+        players = []
+        unknown_names = []
+        for name in dict.fromkeys(names): # remove duplicates
+            player = self.players.get_player(name)
+            if player is None:
+                unknown_names.append(name)
+            else:
+                players.append(player)
+        
+        semaphore = asyncio.Semaphore(self.bot.config.api_concurrency)
+
+        async def fetch(name: str) -> dict | None:
+            async with semaphore:
+                try:
+                    return await asyncio.to_thread(
+                        Player({"uuid": name}, self.players).fetch_stats
+                    )
+                except (ValueError, APIError): # invalid player or API unavailable
+                    return None
+                except Exception: # one name must not fail the others
+                    logging.exception(f"Cannot fetch the player {name}")
+                    return None
+        
+        logging.info(f"Fetching {len(unknown_names)} new users")
+        results = await asyncio.gather(*(fetch(name) for name in unknown_names))
+
+        not_found = []
+        new_players = []
+        for name, raw_stats in zip(unknown_names, results):
+            if raw_stats is None:
+                not_found.append(name)
+                continue
+            
+            player = self.players.get_player(raw_stats["data"][0].get("uuid"))
+            if player is None:
+                player = Player({"uuid": name}, self.players)
+                player.update_stats(raw_stats)
+                self.players.add_player(player)
+                new_players.append(player)
+            else: # fetched with another name
+                player.update_stats(raw_stats)
+            if player not in players:
+                players.append(player)
+        
+        return players, not_found, new_players
+    
+    @tasks.loop(seconds=30) # the API fetch will only be done when the cache expires, the interval is set by the configuration
     async def refresh(self):
         """Refresh stored players and send login and logout messages in
         consequence.
@@ -658,10 +1798,22 @@ class Wynncraft(commands.Cog):
         issues.
         """
 
-        for player in self.players:
+        for player in list(self.players): # the list can change during the sweep
             was_online = player.stats.online
             
-            player.refresh() # cache is handled by the function
+            try:
+                if player.needs_refresh:
+                    raw_stats = await asyncio.to_thread(player.fetch_stats)
+                    player.update_stats(raw_stats)
+            except (ValueError, APIError) as e:
+                # keep the last known stats, the player is refreshed next time
+                if not player.stale:
+                    logging.warn(f"Cannot refresh the player {player.name}: {e}")
+                player.data["stale"] = True
+                continue
+            except Exception:
+                logging.exception(f"Cannot refresh the player {player.name}")
+                continue
 
             if len(player.targets.raw_targets) > 0: # channels are subscribed to login / logout messages
                 if was_online != player.stats.online: # the user connected or disconnected
@@ -669,17 +1821,107 @@ class Wynncraft(commands.Cog):
                         message = f"{player.name} just logged into `{player.stats.server}`!"
                     else:
                         message = f"{player.name} logged out."
-                    embed = player.get_embed()
-                    async for channel in player.targets:
-                        try:
-                            await channel.send(
-                                content=message,
-                                embed=embed,
-                            )
-                        except discord.Forbidden:
-                            logging.warn(
-                                f"Cannot send message in {channel.mention}"
-                            )
+                    await self.notify(player.targets, message, player.get_embed())
+        
+        await self.refresh_guilds()
+        await self.flush_digests()
+    
+    async def refresh_guilds(self):
+        """Refresh the tracked guilds and send the member login, logout, join
+        and leave messages.
+        The online members of every guild are found with a single request, the
+        guild rosters are only fetched when their cache expires.
+        """
+        if len(self.guilds.guilds) == 0:
+            return
+        
+        try:
+            online_players = await asyncio.to_thread(fetch_online_players, self.api)
+        except APIError as e:
+            logging.warn(f"Cannot fetch the online players: {e}")
+            return
+        except Exception:
+            logging.exception("Cannot fetch the online players")
+            return
+        changed = False
+
+        for guild in self.guilds:
+            try:
+                changed = await self.refresh_guild(guild, online_players) or changed
+            except Exception:
+                logging.exception(f"Cannot refresh the guild {guild.name}")
+        
+        if changed:
+            self.guilds.save()
+    
+    async def refresh_guild(self, guild: Guild, online_players: dict[str, str]) -> bool:
+        """Refresh a guild and send its notifications.
+        Returns whether the guild has been modified."""
+        last_fetched = guild.last_fetched
+        joined, left = [], []
+        try:
+            if guild.needs_refresh:
+                raw_guild = await asyncio.to_thread(guild.fetch_roster)
+                joined, left = guild.update_roster(raw_guild)
+        except (ValueError, APIError) as e: # keep the last known roster
+            logging.warn(f"Cannot refresh the guild {guild.name}: {e}")
+        logged_in, logged_out = guild.update_online(online_players)
+
+        messages = [f"{name} joined the guild `{guild.name}`!" for name in joined]
+        messages += [f"{name} left the guild `{guild.name}`." for name in left]
+        messages += [
+            f"{name} from `{guild.name}` just logged into `{guild.online_members[name]}`!"
+            for name in logged_in
+        ]
+        messages += [f"{name} from `{guild.name}` logged out." for name in logged_out]
+
+        # the embed is only sent with the first message of a busy guild
+        for n, content in enumerate(split_lines(messages)):
+            await self.notify(
+                guild.targets,
+                content,
+                guild.get_embed() if n == 0 else None,
+            )
+        return len(messages) > 0 or guild.last_fetched != last_fetched
+    
+    async def notify(self, targets: Targets, message: str, embed: discord.Embed | None):
+        """Sends a notification to every target.
+        For the targets in digest mode, the message is only sent when the
+        digests are flushed.
+        """
+        async for target, channel in targets.items():
+            digest_mode = target.get("digest", DIGEST_OFF)
+            if digest_mode != DIGEST_OFF:
+                digest = self.digests.get(channel.id)
+                if digest is None:
+                    digest = Digest(channel)
+                    self.digests[channel.id] = digest
+                digest.mode = digest_mode
+                digest.add(message)
+                continue
+            
+            try:
+                await channel.send(
+                    content=message,
+                    embed=embed,
+                )
+            except discord.HTTPException as e: # the other targets are still notified
+                logging.warn(
+                    f"Cannot send message in {target['id']}: {e}" # DM channels have no mention
+                )
+    
+    async def flush_digests(self, force: bool = False):
+        """Sends the digests whose window has elapsed, or every digest if
+        `force` is True."""
+        window = self.bot.config.digest_window
+        for digest in self.digests.values():
+            if digest.is_due(window) or (force and len(digest.events) > 0):
+                try:
+                    await digest.flush()
+                except discord.HTTPException as e:
+                    logging.warn(
+                        f"Cannot send digest in {digest.channel.id}: {e}" # DM channels have no mention
+                    )
 
 async def setup(bot: Client):
     await bot.add_cog(Wynncraft(bot))
@@ -1,11 +1,14 @@
 import argparse
+import asyncio
 import logging
+import time
 
-from utils import Client, Configuration
+from utils import CODECS, Client, Configuration, Storage, get_codec
 
 def start(
     sync_commands: bool = False,
     proxy: str | None = None,
+    profile: int | None = None,
 ):
     try:
         config = Configuration()
@@ -27,10 +30,64 @@ def start(
             await bot.tree.sync()
             logging.info("Application commands synced")
         
+        if profile is not None:
+            def log_profile(task: asyncio.Task):
+                if task.cancelled():
+                    logging.warning("The profile has been cancelled")
+                elif task.exception() is not None:
+                    logging.error("The profile failed", exc_info=task.exception())
+                else:
+                    logging.info(f"Profile summary:\n{task.result()[1]}")
+            
+            profile_task = asyncio.create_task(cog.profile(profile))
+            profile_task.add_done_callback(log_profile)
+        
         await cog.refresh.start()
     
     bot.run()
 
+def convert(
+    input_file: str,
+    output_file: str,
+    codec_name: str,
+):
+    """Converts a storage file to another codec, the input codec is
+    detected automatically."""
+    storage = Storage(input_file)
+    storage.load()
+
+    storage.file = output_file
+    storage.codec = get_codec(codec_name)
+    storage.save()
+
+    print(f"{input_file} converted to {output_file} ({codec_name})")
+
+def benchmark(
+    input_file: str,
+    repeat: int = 10,
+):
+    """Measures the load and save time and the size of a storage file with
+    every available codec."""
+    storage = Storage(input_file)
+    storage.load()
+    data = storage.data
+
+    print(f"{'codec':<10} {'size':>12} {'load (ms)':>10} {'save (ms)':>10}")
+    for codec in CODECS.values():
+        raw = codec.dumps(data)
+
+        start_time = time.perf_counter()
+        for _ in range(repeat):
+            codec.dumps(data)
+        save_time = (time.perf_counter() - start_time) / repeat
+
+        start_time = time.perf_counter()
+        for _ in range(repeat):
+            codec.decode(raw)
+        load_time = (time.perf_counter() - start_time) / repeat
+
+        print(f"{codec.name:<10} {len(raw):>12,} {load_time * 1000:>10.1f} {save_time * 1000:>10.1f}")
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -45,6 +102,46 @@ if __name__ == "__main__":
         required=False,
     )
 
+    parser.add_argument(
+        "--profile",
+        help="profile the bot for this number of seconds after the start",
+        type=int,
+        required=False,
+        metavar="SECONDS",
+    )
+
+    subparsers = parser.add_subparsers(dest="command")
+
+    convert_parser = subparsers.add_parser(
+        "convert",
+        help="convert a storage file (like players.json) to another codec",
+    )
+    convert_parser.add_argument("input", help="the file to convert")
+    convert_parser.add_argument("output", help="the converted file")
+    convert_parser.add_argument(
+        "--codec",
+        help="the codec of the converted file",
+        choices=list(CODECS),
+        default=get_codec().name,
+    )
+
+    benchmark_parser = subparsers.add_parser(
+        "benchmark",
+        help="compare the codecs on a storage file",
+    )
+    benchmark_parser.add_argument("input", help="the file to use")
+    benchmark_parser.add_argument(
+        "--repeat",
+        help="the number of measures to average",
+        type=int,
+        default=10,
+    )
+
     args = parser.parse_args()
     
-    start(sync_commands=args.sync, proxy=args.proxy)
+    if args.command == "convert":
+        convert(args.input, args.output, args.codec)
+    elif args.command == "benchmark":
+        benchmark(args.input, args.repeat)
+    else:
+        start(sync_commands=args.sync, proxy=args.proxy, profile=args.profile)
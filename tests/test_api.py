@@ -0,0 +1,105 @@
+import threading
+import urllib.error
+
+import pytest
+
+from utils.api import (
+    APIClient,
+    CircuitBreaker,
+    CircuitOpenError,
+    NotFoundError,
+    RequestLimiter,
+    ServerError,
+    classify_error,
+)
+
+def fail(error: Exception):
+    raise error
+
+def test_classify_error():
+    not_found = urllib.error.HTTPError("url", 404, "Not found", None, None)
+    assert isinstance(classify_error(not_found), NotFoundError)
+    assert isinstance(classify_error(ConnectionResetError()), ServerError)
+    assert isinstance(classify_error(OSError("SSL handshake failed")), ServerError)
+    with pytest.raises(KeyError): # a bug, not an API error
+        classify_error(KeyError("data"))
+
+def test_breaker_opens_and_closes():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0)
+    client = APIClient(retries=0, breaker=breaker)
+
+    for _ in range(2):
+        with pytest.raises(ServerError):
+            client.call(fail, ConnectionError())
+    assert breaker.open
+
+    assert breaker.allow() # the test call
+    assert not breaker.allow() # only one test call at once
+    breaker.record_success()
+    assert not breaker.open
+    assert client.call(lambda: 1) == 1
+
+def test_breaker_refuses_calls_while_open():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    client = APIClient(retries=0, breaker=breaker)
+
+    with pytest.raises(ServerError):
+        client.call(fail, ConnectionError())
+    with pytest.raises(CircuitOpenError):
+        client.call(lambda: 1)
+
+def test_unknown_error_releases_the_test_call():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    client = APIClient(retries=0, breaker=breaker)
+
+    with pytest.raises(ServerError):
+        client.call(fail, ConnectionError())
+    with pytest.raises(KeyError):
+        client.call(fail, KeyError("data"))
+    assert not breaker.testing
+
+    assert client.call(lambda: 1) == 1
+    assert not breaker.open
+
+def test_transient_errors_are_retried():
+    errors = [ConnectionError(), ConnectionError()]
+
+    def flaky():
+        if len(errors) > 0:
+            raise errors.pop()
+        return "ok"
+
+    client = APIClient(retries=2, base_delay=0)
+    assert client.call(flaky) == "ok"
+
+    with pytest.raises(NotFoundError): # not retried
+        client.call(fail, urllib.error.HTTPError("url", 404, "Not found", None, None))
+
+def test_limiter_concurrency():
+    limiter = RequestLimiter(concurrency=1, budget=1000)
+    limiter.acquire()
+
+    acquired = threading.Event()
+    def acquire():
+        limiter.acquire()
+        acquired.set()
+    thread = threading.Thread(target=acquire)
+    thread.start()
+
+    assert not acquired.wait(0.1) # blocked by the first call
+    limiter.release()
+    assert acquired.wait(1)
+    thread.join()
+    limiter.release()
+    assert limiter.active == 0
+
+def test_limiter_budget():
+    limiter = RequestLimiter(concurrency=10, budget=2)
+    for _ in range(2):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.tokens < 1 # the next call waits for the bucket to refill
+
+    limiter.configure(concurrency=10, budget=6000) # 100 calls per second
+    limiter.acquire()
+    limiter.release()
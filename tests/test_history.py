@@ -0,0 +1,65 @@
+import os
+
+from utils.history import DELTA_SIZE, History, HistoryStore
+
+def test_range_and_downsample(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    for i in range(100):
+        store.record("player", 1000 + i * 10, {"a": i * i})
+
+    history = HistoryStore(str(tmp_path)).get("player") # reloaded from the disk
+    assert len(history) == 100
+    assert history.range("a", 1000, 1030) == [(1000, 0), (1010, 1), (1020, 4), (1030, 9)]
+    assert len(history.downsample("a", 5)) == 5
+    assert history.downsample("a", 5)[-1] == (1990, 99 * 99)
+
+def test_downsample_sparse_range(tmp_path):
+    history = History(str(tmp_path))
+    day = 24 * 3600
+    start = 100 * day
+    for i in range(48): # one day of data, every 30 minutes
+        history.append(start + 29 * day + i * 1800, {"a": 100 + i})
+
+    rows = history.downsample("a", 30, start, start + 30 * day)
+    assert len(rows) == 30
+    assert rows[0] == (start + 29 * day, 100) # the first row is kept
+    assert rows[-1] == (start + 29 * day + 47 * 1800, 147)
+    assert [timestamp for timestamp, _ in rows] == sorted({timestamp for timestamp, _ in rows})
+
+def test_new_field_is_padded(tmp_path):
+    history = History(str(tmp_path))
+    history.append(100, {"a": 1})
+    history.append(200, {"a": 2, "b": 5})
+
+    assert history.range("b") == [(100, 0), (200, 5)]
+
+def test_interrupted_append(tmp_path):
+    history = History(str(tmp_path))
+    for i in range(3):
+        history.append(100 * i, {"a": i})
+
+    # the process stopped after writing the data column but before the
+    # timestamp column
+    history.columns["a"].append([3])
+    history = History(str(tmp_path))
+    assert history.range("a") == [(0, 0), (100, 1), (200, 2)]
+
+    history.append(300, {"a": 4})
+    assert History(str(tmp_path)).range("a")[-1] == (300, 4)
+
+def test_torn_write(tmp_path):
+    history = History(str(tmp_path))
+    for i in range(3):
+        history.append(100 * i, {"a": i})
+
+    # a partial delta at the end of the files
+    for field in ("a", "timestamp"):
+        with open(history.get_path(field), mode='ab') as file:
+            file.write(b"\x01" * (DELTA_SIZE - 1))
+
+    history = History(str(tmp_path))
+    assert history.range("a") == [(0, 0), (100, 1), (200, 2)]
+    assert os.path.getsize(history.get_path("a")) == 8 + 2 * DELTA_SIZE
+
+    history.append(300, {"a": 3})
+    assert History(str(tmp_path)).range("a")[-1] == (300, 3)
@@ -1,4 +1,10 @@
 from .client import *
 from .configuration import *
 from .storage import *
-from .converter import *
\ No newline at end of file
+from .converter import *
+from .assets import *
+from .history import *
+from .leaderboard import *
+from .api import *
+from .profiler import *
+from .cache import *
\ No newline at end of file
@@ -0,0 +1,245 @@
+"""Fault tolerance for the calls to the Wynncraft API.
+
+The errors are classified to know whether a call should be retried, the
+transient failures are retried with an exponential backoff and jitter, and a
+circuit breaker stops calling the API during outages.
+"""
+
+import http.client
+import json
+import logging
+import random
+import threading
+import time
+import urllib.error
+
+__all__ = [
+    "APIError",
+    "NotFoundError",
+    "RateLimitedError",
+    "ServerError",
+    "CircuitOpenError",
+    "classify_error",
+    "CircuitBreaker",
+    "RequestLimiter",
+    "APIClient",
+]
+
+class APIError(Exception):
+    """Base class of the errors raised when calling the API."""
+    transient = False
+
+class NotFoundError(APIError):
+    """The requested resource does not exist (player, guild...)."""
+
+class RateLimitedError(APIError):
+    """Too many requests have been made."""
+    transient = True
+
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class ServerError(APIError):
+    """The API is unavailable or returned an invalid response."""
+    transient = True
+
+class CircuitOpenError(APIError):
+    """The API is not called because it failed too many times recently."""
+
+def classify_error(error: Exception) -> APIError:
+    """Converts an exception raised while calling the API to an `APIError`."""
+    if isinstance(error, APIError):
+        return error
+    if isinstance(error, urllib.error.HTTPError):
+        if error.code in (400, 404): # the API uses both for unknown players
+            return NotFoundError(f"Not found ({error.code})")
+        if error.code == 429:
+            retry_after = error.headers.get("Retry-After") if error.headers else None
+            try:
+                retry_after = float(retry_after) if retry_after is not None else None
+            except ValueError:
+                retry_after = None
+            return RateLimitedError("Rate limited", retry_after)
+        return ServerError(f"HTTP error {error.code}")
+    if isinstance(error, (
+        OSError, # includes URLError, timeouts, connection and SSL errors
+        http.client.HTTPException,
+        json.JSONDecodeError,
+    )):
+        return ServerError(f"{type(error).__name__}: {error}")
+    raise error # not an API error, it's a bug
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 60,
+    ):
+        """After `failure_threshold` consecutive failures, the circuit opens
+        and the calls are refused for `reset_timeout` seconds. Then a single
+        call is allowed to test the API: the circuit closes if it succeeds,
+        else it opens again.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.testing = False
+        self.lock = threading.Lock()
+
+    @property
+    def open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        """Returns whether a call can be made."""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.testing or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.testing = True # half open, let one call through
+            return True
+
+    def record_success(self):
+        with self.lock:
+            if self.opened_at is not None:
+                logging.info("The API is available again, closing the circuit")
+            self.failures = 0
+            self.opened_at = None
+            self.testing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.testing or (
+                self.opened_at is None and self.failures >= self.failure_threshold
+            ):
+                if not self.testing:
+                    logging.warning("The API keeps failing, opening the circuit")
+                self.opened_at = time.monotonic()
+                self.testing = False
+
+class RequestLimiter:
+    def __init__(
+        self,
+        concurrency: int = 5,
+        budget: float = 180,
+    ):
+        """Limits the calls to `concurrency` simultaneous calls and `budget`
+        calls per minute. The budget is a token bucket, so short bursts are
+        allowed.
+        """
+        self.condition = threading.Condition()
+        self.concurrency = concurrency
+        self.budget = budget
+        self.active = 0
+        self.tokens = budget
+        self.updated = time.monotonic()
+
+    def configure(self, concurrency: int, budget: float):
+        """Changes the limits, the waiting calls are woken up."""
+        with self.condition:
+            self.refill()
+            self.concurrency = concurrency
+            self.budget = budget
+            self.tokens = min(self.tokens, budget)
+            self.condition.notify_all()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.budget,
+            self.tokens + (now - self.updated) * self.budget / 60,
+        )
+        self.updated = now
+
+    def acquire(self):
+        """Waits until a call can be made."""
+        with self.condition:
+            while True:
+                self.refill()
+                if self.active < self.concurrency and self.tokens >= 1:
+                    self.tokens -= 1
+                    self.active += 1
+                    return
+                if self.active >= self.concurrency:
+                    self.condition.wait() # woken up by `release`
+                else:
+                    self.condition.wait((1 - self.tokens) * 60 / self.budget)
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+class APIClient:
+    def __init__(
+        self,
+        retries: int = 3,
+        base_delay: float = 1,
+        max_delay: float = 30,
+        breaker: CircuitBreaker | None = None,
+        limiter: RequestLimiter | None = None,
+    ):
+        """Calls the API, retrying the transient failures at most `retries`
+        times. The delay between two tries is random between 0 and
+        `base_delay * 2 ** try`, capped to `max_delay` seconds.
+        """
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.limiter = limiter if limiter is not None else RequestLimiter()
+
+    def configure(self, concurrency: int, budget: float):
+        """Changes the concurrency and the number of requests per minute."""
+        self.limiter.configure(concurrency, budget)
+
+    def get_delay(self, attempt: int, error: APIError) -> float:
+        if isinstance(error, RateLimitedError) and error.retry_after is not None:
+            return min(self.max_delay, error.retry_after)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, function, *args, **kwargs):
+        """Calls `function` with the arguments and returns the result.
+        This function blocks while waiting between two tries, so it must be
+        run outside of the event loop.
+        Raises:
+          CircuitOpenError when the API is unavailable.
+          NotFoundError when the resource does not exist.
+          RateLimitedError or ServerError when every try failed.
+        """
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                raise CircuitOpenError("The API is unavailable")
+
+            self.limiter.acquire()
+            try:
+                result = function(*args, **kwargs)
+            except BaseException as e:
+                try:
+                    error = classify_error(e)
+                except BaseException:
+                    # not an API error, but the call still failed: the circuit
+                    # must not wait forever for the result of a test call
+                    self.breaker.record_failure()
+                    raise
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                self.limiter.release()
+
+            if not error.transient: # the API works, the request is wrong
+                self.breaker.record_success()
+                raise error
+
+            self.breaker.record_failure()
+            if attempt == self.retries:
+                raise error
+
+            delay = self.get_delay(attempt, error)
+            logging.info(f"API call failed ({error}), retrying in {delay:.1f}s")
+            time.sleep(delay)
@@ -0,0 +1,132 @@
+"""The asset pipeline, used to rasterize the icons of the game and to upload
+them as custom emojis.
+
+The SVG files are downloaded, then rasterized in a process pool at every
+requested size. The generated images are stored in a content-addressed cache:
+an image is named after the hash of the SVG it comes from, so an unchanged
+asset is never converted twice.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import hashlib
+import logging
+import multiprocessing
+import os
+import urllib.request
+
+import discord
+
+from .converter import rasterize_svg
+
+__all__ = [
+    "AssetPipeline",
+]
+
+def _rasterize(svg: bytes, size: int, output_path: str):
+    """Worker function executed in the process pool."""
+    png = rasterize_svg(svg, size)
+
+    # write in a temporary file first so an interrupted conversion never
+    # leaves a broken file in the cache
+    temporary_path = output_path + ".tmp"
+    with open(temporary_path, mode='wb') as file:
+        file.write(png)
+    os.replace(temporary_path, output_path)
+
+def _download(url: str) -> bytes:
+    request = urllib.request.Request(
+        url,
+        headers={"User-Agent": "WynncraftDiscordBot"},
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return response.read()
+
+class AssetPipeline:
+    def __init__(
+        self,
+        directory: str = "./assets",
+        sizes: tuple[int, ...] = (64, 128),
+        max_workers: int | None = None,
+    ):
+        """Initialize the pipeline, the images are cached in `directory`.
+        Every asset is rasterized once for each size of `sizes`.
+        `max_workers` is the size of the process pool, defaults to the number
+        of processors.
+        """
+        self.directory = directory
+        self.sizes = sizes
+        self.max_workers = max_workers
+
+    def get_path(self, digest: str, size: int) -> str:
+        """Returns the path of the cached image of the SVG with the hash
+        `digest` rasterized at `size` pixels."""
+        return os.path.join(self.directory, digest[:2], f"{digest}-{size}.png")
+
+    async def build(
+        self,
+        assets: dict[str, str],
+    ) -> dict[str, dict[int, str]]:
+        """Downloads and rasterizes the assets.
+        `assets` maps the name of each asset to the location of its SVG.
+        Returns the path of the png of every asset at every size, by name.
+        """
+        loop = asyncio.get_running_loop()
+
+        names = list(assets.keys())
+        svgs = await asyncio.gather(
+            *(asyncio.to_thread(_download, assets[name]) for name in names)
+        )
+
+        paths = {}
+        jobs = {} # by path, the assets with the same SVG are converted once
+
+        for name, svg in zip(names, svgs):
+            digest = hashlib.sha256(svg).hexdigest()
+            os.makedirs(os.path.dirname(self.get_path(digest, 0)), exist_ok=True)
+
+            paths[name] = {}
+            for size in self.sizes:
+                path = self.get_path(digest, size)
+                paths[name][size] = path
+                if not os.path.isfile(path): # not already converted
+                    jobs[path] = (svg, size, path)
+
+        if len(jobs) > 0:
+            logging.info(f"Rasterizing {len(jobs)} images")
+            # the bot is running other threads, forking could copy a held lock
+            with concurrent.futures.ProcessPoolExecutor(
+                self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            ) as pool:
+                await asyncio.gather(
+                    *(loop.run_in_executor(pool, _rasterize, *job) for job in jobs.values())
+                )
+
+        return paths
+
+    async def sync_emojis(
+        self,
+        guild: discord.Guild,
+        images: dict[str, str],
+    ) -> dict[str, str]:
+        """Creates a custom emoji in `guild` for every image of `images`, a
+        mapping from the name of the emoji to the path of the image.
+        Emojis already existing with the same name are reused.
+        Returns the string representation of every emoji, by name.
+        """
+        existing = {emoji.name: emoji for emoji in guild.emojis}
+        emojis = {}
+
+        for name, path in images.items():
+            emoji = existing.get(name)
+            if emoji is None:
+                with open(path, mode='rb') as file:
+                    image = file.read()
+                emoji = await guild.create_custom_emoji(name=name, image=image)
+                logging.info(f"Created the emoji {name} in the guild {guild.name}")
+            emojis[name] = str(emoji)
+
+        return emojis
@@ -0,0 +1,50 @@
+"""A small in-memory cache whose entries expire."""
+
+import time
+
+__all__ = [
+    "TTLCache",
+]
+
+class TTLCache:
+    entries: dict
+
+    def __init__(
+        self,
+        ttl: float,
+        negative_ttl: float | None = None,
+        max_size: int = 10000,
+    ):
+        """Initialize the cache, the entries expire after `ttl` seconds.
+        `None` values are negative results (the object doesn't exist), they
+        expire after `negative_ttl` seconds, `ttl` by default.
+        When the cache is full, the oldest entry is removed.
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl if negative_ttl is not None else ttl
+        self.max_size = max_size
+        self.entries = {} # key -> (expiration, value), oldest first
+
+    def lookup(self, key) -> tuple[bool, object]:
+        """Returns whether `key` is cached and its value, so the negative
+        results (`None`) can be told apart from the missing keys."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return False, None
+
+        expiration, value = entry
+        if expiration <= time.monotonic():
+            del self.entries[key]
+            return False, None
+        return True, value
+
+    def set(self, key, value):
+        self.entries.pop(key, None) # move the key to the end
+        if len(self.entries) >= self.max_size:
+            del self.entries[next(iter(self.entries))]
+
+        ttl = self.negative_ttl if value is None else self.ttl
+        self.entries[key] = (time.monotonic() + ttl, value)
+
+    def invalidate(self, key):
+        self.entries.pop(key, None)
@@ -1,6 +1,9 @@
 import json
+import logging
 import os.path
 
+from .storage import get_codec
+
 __all__ = [
     "Configuration",
 ]
@@ -13,6 +16,7 @@ class Configuration():
         file: str = "./config.json"
     ):
         self.config_file_path = file
+        self.last_modified = None
 
         self.load()
     
@@ -24,6 +28,7 @@ class Configuration():
           FileNotFoundError when the configuration file has not been set.
         """
         if os.path.isfile(self.config_file_path):
+            self.last_modified = os.path.getmtime(self.config_file_path)
             with open(
                 self.config_file_path,
                 mode='r',
@@ -32,6 +37,65 @@ class Configuration():
                 self.raw_config = json.load(config_file)
         else:
             raise FileNotFoundError("The configuration file has not been set.")
+        
+        self.validate()
+    
+    def validate(self):
+        """Checks every tunable value of the configuration.
+        Raises:
+          ValueError when a value is invalid.
+        """
+        self.emoji_guild
+        self.digest_window
+        self.refresh_interval
+        self.player_cache_time
+        self.guild_cache_time
+        self.players_file
+        self.guilds_file
+        self.history_directory
+        self.storage_codec
+        self.api_concurrency
+        self.api_request_budget
+    
+    def has_changed(self) -> bool:
+        """Whether the configuration file has been modified since it was
+        loaded."""
+        try:
+            return os.path.getmtime(self.config_file_path) != self.last_modified
+        except OSError:
+            return False
+    
+    def reload(self) -> bool:
+        """Loads the configuration again, keeping the current configuration if
+        the new one is invalid.
+        Returns whether the new configuration has been loaded.
+        """
+        raw_config = self.raw_config
+        try:
+            self.load()
+        except (OSError, ValueError) as e: # JSONDecodeError is a ValueError
+            logging.error(f"Invalid configuration, keeping the current one: {e}")
+            self.raw_config = raw_config
+            return False
+        
+        logging.info("Configuration reloaded")
+        return True
+    
+    def get_positive_number(self, key: str, default: int | float) -> int | float:
+        value = self.raw_config.get(key, default)
+
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+            raise ValueError(f'The {key} must be a positive number')
+        
+        return value
+    
+    def get_path(self, key: str, default: str) -> str:
+        path = self.raw_config.get(key, default)
+
+        if not isinstance(path, str) or path == "":
+            raise ValueError(f'The {key} must be a path')
+        
+        return path
     
     @property
     def token(self) -> str:
@@ -42,4 +106,93 @@ class Configuration():
         if token is None:
             raise ValueError('The token has not been set')
         
-        return token
\ No newline at end of file
+        return token
+    
+    @property
+    def emoji_guild(self) -> int | None:
+        """Returns the ID of the guild where the emojis are created, if set"""
+
+        guild_id = self.raw_config.get('emoji_guild')
+
+        if guild_id is not None and not isinstance(guild_id, int):
+            raise ValueError('The emoji guild must be a guild ID')
+        
+        return guild_id
+    
+    @property
+    def digest_window(self) -> int:
+        """Returns the time in seconds during which the notifications sent to
+        a channel in digest mode are merged (5 minutes by default)"""
+
+        return self.get_positive_number('digest_window', 300)
+    
+    @property
+    def refresh_interval(self) -> int | float:
+        """Returns the time in seconds between two refreshes of the players
+        (30 seconds by default)"""
+
+        return self.get_positive_number('refresh_interval', 30)
+    
+    @property
+    def player_cache_time(self) -> int | float:
+        """Returns the minimum time in seconds between two fetches of the
+        stats of a player (30 minutes by default)"""
+
+        return self.get_positive_number('player_cache_time', 1800)
+    
+    @property
+    def guild_cache_time(self) -> int | float:
+        """Returns the minimum time in seconds between two fetches of the
+        members of a guild (10 minutes by default)"""
+
+        return self.get_positive_number('guild_cache_time', 600)
+    
+    @property
+    def players_file(self) -> str:
+        """Returns the path of the file where the players are stored"""
+
+        return self.get_path('players_file', './players.json')
+    
+    @property
+    def guilds_file(self) -> str:
+        """Returns the path of the file where the guilds are stored"""
+
+        return self.get_path('guilds_file', './guilds.json')
+    
+    @property
+    def history_directory(self) -> str:
+        """Returns the path of the directory where the history of the players
+        is stored, only read when the bot starts"""
+
+        return self.get_path('history_directory', './history')
+    
+    @property
+    def storage_codec(self) -> str | None:
+        """Returns the name of the codec used to save the players, the fastest
+        JSON codec available is used if not set"""
+
+        codec = self.raw_config.get('storage_codec')
+
+        if codec is not None:
+            get_codec(codec) # raises ValueError if the codec is not available
+        
+        return codec
+    
+    @property
+    def api_concurrency(self) -> int:
+        """Returns the maximum number of simultaneous requests to the
+        Wynncraft API (5 by default)"""
+
+        concurrency = self.get_positive_number('api_concurrency', 5)
+
+        if not isinstance(concurrency, int):
+            raise ValueError('The api_concurrency must be an integer')
+        
+        return concurrency
+    
+    @property
+    def api_request_budget(self) -> int | float:
+        """Returns the maximum number of requests made to the Wynncraft API per
+        minute (180 by default)"""
+
+        return self.get_positive_number('api_request_budget', 180)
\ No newline at end of file
@@ -7,9 +7,13 @@ from cairosvg import svg2png
 
 __all__ = [
     "convert_svg_to_png",
+    "rasterize_svg",
     "convert_timedelta",
+    "convert_sparkline",
 ]
 
+SPARKLINE_BLOCKS = "▁▂▃▄▅▆▇█"
+
 def convert_svg_to_png(
     svg_uri_path: str,
     png_output_path: str
@@ -23,6 +27,19 @@ def convert_svg_to_png(
         write_to=png_output_path,
     )
 
+def rasterize_svg(
+    svg: bytes,
+    size: int,
+) -> bytes:
+    """Rasterizes the SVG image `svg` into a square png of `size` pixels and
+    returns the png file content.
+    """
+    return svg2png(
+        bytestring=svg,
+        output_width=size,
+        output_height=size,
+    )
+
 def convert_timedelta(time: datetime.timedelta) -> str:
     """Converts timedelta in a nice string representation."""
     if time.days < 3:
@@ -32,6 +49,20 @@ def convert_timedelta(time: datetime.timedelta) -> str:
         hours = time.total_seconds() // 3600 - days * 24
         return f"{int(days)} days and {int(hours)} hours"
 
+def convert_sparkline(values: list[int]) -> str:
+    """Converts a list of values in a small text chart."""
+    if len(values) == 0:
+        return ""
+    low = min(values)
+    high = max(values)
+    if high == low:
+        return SPARKLINE_BLOCKS[0] * len(values)
+    
+    scale = (len(SPARKLINE_BLOCKS) - 1) / (high - low)
+    return "".join(
+        SPARKLINE_BLOCKS[round((value - low) * scale)] for value in values
+    )
+
 if __name__ == "__main__":
     convert_svg_to_png("https://cdn.wynncraft.com/nextgen/classes/icons/archer.svg", "./archer.png")
     convert_svg_to_png("https://cdn.wynncraft.com/nextgen/classes/icons/mage.svg", "./mage.png")
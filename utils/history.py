@@ -0,0 +1,256 @@
+"""A compact store for the history of numeric values, like player statistics.
+
+The history of every entity (a player for instance) lives in its own
+directory, with one file per field. The first row of a column is stored as a
+64 bits integer, the following rows are stored as 32 bits differences with
+the previous row. Statistics grow slowly, so the columns stay small and the
+files can directly be memory-mapped to be decoded.
+"""
+
+import array
+import bisect
+import itertools
+import mmap
+import os
+import struct
+
+__all__ = [
+    "Column",
+    "History",
+    "HistoryStore",
+]
+
+BASE_FORMAT = "<q"
+BASE_SIZE = struct.calcsize(BASE_FORMAT)
+DELTA_TYPECODE = "i" # 32 bits signed on all the supported platforms
+DELTA_SIZE = array.array(DELTA_TYPECODE).itemsize
+DELTA_MIN = -2**31
+DELTA_MAX = 2**31 - 1
+
+class Column:
+    values: array.array
+
+    def __init__(self, path: str):
+        """Initialize the column stored in the file at the path `path`.
+        The values are decoded from the file if it exists.
+        """
+        self.path = path
+        self.load()
+
+    def load(self):
+        """Decodes the column from the file, using a memory map.
+        The bytes of an interrupted write (a partial value at the end of the
+        file) are removed from the file.
+        """
+        self.values = array.array("q")
+
+        if not os.path.isfile(self.path):
+            return
+
+        size = os.path.getsize(self.path)
+        if size < BASE_SIZE:
+            self.truncate(0)
+            return
+
+        deltas_size = size - BASE_SIZE
+        deltas_size -= deltas_size % DELTA_SIZE
+
+        with open(self.path, mode='rb') as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                base, = struct.unpack_from(BASE_FORMAT, mapped)
+                with memoryview(mapped)[BASE_SIZE:BASE_SIZE + deltas_size] as raw_deltas:
+                    with raw_deltas.cast(DELTA_TYPECODE) as deltas:
+                        self.values.extend(
+                            itertools.accumulate(deltas, initial=base)
+                        )
+
+        if BASE_SIZE + deltas_size != size:
+            self.truncate(len(self.values))
+
+    def truncate(self, length: int):
+        """Removes the rows after the first `length` rows, in memory and on
+        the disk."""
+        del self.values[length:]
+        if os.path.isfile(self.path):
+            os.truncate(
+                self.path,
+                BASE_SIZE + (length - 1) * DELTA_SIZE if length > 0 else 0,
+            )
+
+    def append(self, values: list[int]):
+        """Appends the values at the end of the column, in memory and on the
+        disk."""
+        if len(values) == 0:
+            return
+
+        encoded = bytearray()
+        deltas = array.array(DELTA_TYPECODE)
+
+        previous = self.values[-1] if len(self.values) > 0 else None
+        for value in values:
+            if previous is None:
+                encoded += struct.pack(BASE_FORMAT, value)
+            else:
+                delta = value - previous
+                if not DELTA_MIN <= delta <= DELTA_MAX:
+                    raise ValueError(f"The value {value} is too far from the previous one")
+                deltas.append(delta)
+            previous = value
+
+        encoded += deltas.tobytes()
+
+        with open(self.path, mode='ab') as file:
+            file.write(encoded)
+
+        self.values.extend(values)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+class History:
+    columns: dict[str, Column]
+
+    def __init__(self, directory: str):
+        """Initialize the history stored in the directory `directory`.
+        The `timestamp` column is used to index every row.
+        """
+        self.directory = directory
+        self.columns = {}
+
+        if os.path.isdir(self.directory):
+            for file_name in os.listdir(self.directory):
+                field, extension = os.path.splitext(file_name)
+                if extension == ".col":
+                    self.columns[field] = Column(self.get_path(field))
+
+        if "timestamp" not in self.columns:
+            self.columns["timestamp"] = Column(self.get_path("timestamp"))
+
+        # the timestamp is written last, so after an interrupted append the
+        # other columns can have an extra row, which is removed. A column
+        # created by the interrupted append can be too short, it is padded.
+        for column in self.columns.values():
+            if len(column) > len(self):
+                column.truncate(len(self))
+            elif len(column) < len(self):
+                last_value = column.values[-1] if len(column) > 0 else 0
+                column.append([last_value] * (len(self) - len(column)))
+
+    def get_path(self, field: str) -> str:
+        return os.path.join(self.directory, f"{field}.col")
+
+    @property
+    def timestamps(self) -> array.array:
+        return self.columns["timestamp"].values
+
+    @property
+    def fields(self) -> list[str]:
+        return [field for field in self.columns if field != "timestamp"]
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def append(self, timestamp: int, values: dict[str, int]):
+        """Appends a row to the history.
+        New fields are filled with zeros for the previous rows, and the fields
+        missing from `values` keep their previous value.
+        Rows older than the last one are ignored.
+        """
+        if len(self) > 0 and timestamp <= self.timestamps[-1]:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        for field in values:
+            if field not in self.columns:
+                column = Column(self.get_path(field))
+                column.append([0] * len(self))
+                self.columns[field] = column
+
+        for field, column in self.columns.items():
+            if field == "timestamp":
+                continue
+            value = values.get(field)
+            if value is None:
+                value = column.values[-1] if len(column) > 0 else 0
+            column.append([value])
+
+        # written last, the row only exists once the timestamp is written
+        self.columns["timestamp"].append([timestamp])
+
+    def get_bounds(self, start: int | None, end: int | None) -> tuple[int, int]:
+        """Returns the indexes of the first and after the last rows between the
+        timestamps `start` and `end` (included)."""
+        timestamps = self.timestamps
+        low = 0 if start is None else bisect.bisect_left(timestamps, start)
+        high = len(timestamps) if end is None else bisect.bisect_right(timestamps, end)
+        return low, min(high, len(timestamps))
+
+    def range(
+        self,
+        field: str,
+        start: int | None = None,
+        end: int | None = None,
+    ) -> list[tuple[int, int]]:
+        """Returns the `(timestamp, value)` rows of `field` between the
+        timestamps `start` and `end`.
+        Raises:
+          KeyError when the field has never been recorded.
+        """
+        column = self.columns[field]
+        low, high = self.get_bounds(start, end)
+        return list(zip(self.timestamps[low:high], column.values[low:high]))
+
+    def downsample(
+        self,
+        field: str,
+        buckets: int,
+        start: int | None = None,
+        end: int | None = None,
+    ) -> list[tuple[int, int]]:
+        """Same as `range`, but returns at most `buckets` rows: the first row
+        is kept, then the time until the last row is split in buckets of the
+        same duration and the last row of each bucket is kept.
+        The buckets start at the first row and not at `start`, so the data
+        recorded on a part of the range is not squeezed in a few buckets.
+        """
+        column = self.columns[field]
+        low, high = self.get_bounds(start, end)
+        if high - low <= buckets:
+            return self.range(field, start, end)
+
+        timestamps = self.timestamps
+        first = timestamps[low]
+        last = timestamps[high - 1]
+        duration = (last - first) / max(buckets - 1, 1)
+
+        rows = [(timestamps[low], column.values[low])]
+        previous = low
+        for bucket in range(1, buckets):
+            bound = last if bucket == buckets - 1 else first + duration * bucket
+            index = bisect.bisect_right(timestamps, bound, low, high) - 1
+            if index > previous:
+                rows.append((timestamps[index], column.values[index]))
+                previous = index
+
+        return rows
+
+class HistoryStore:
+    histories: dict[str, History]
+
+    def __init__(self, directory: str):
+        """Initialize the store, the histories are saved in `directory`."""
+        self.directory = directory
+        self.histories = {}
+
+    def get(self, key: str) -> History:
+        """Returns the history of `key`, loaded from the disk the first time."""
+        history = self.histories.get(key)
+        if history is None:
+            history = History(os.path.join(self.directory, key))
+            self.histories[key] = history
+        return history
+
+    def record(self, key: str, timestamp: int, values: dict[str, int]):
+        """Appends a row to the history of `key`."""
+        self.get(key).append(timestamp, values)
@@ -0,0 +1,58 @@
+"""Leaderboards kept sorted while the values are updated, so the top and the
+rank queries don't need to sort everything.
+"""
+
+import bisect
+
+__all__ = [
+    "Leaderboard",
+]
+
+class Leaderboard:
+    entries: list[tuple[int, str]]
+    values: dict[str, int]
+
+    def __init__(self):
+        """Initialize an empty leaderboard, the highest values come first."""
+        self.entries = [] # sorted (-value, key) pairs
+        self.values = {}
+
+    def update(self, key: str, value: int):
+        """Sets the value of `key`, adding it if needed."""
+        old_value = self.values.get(key)
+        if old_value == value:
+            return
+        if old_value is not None:
+            self.remove(key)
+
+        bisect.insort(self.entries, (-value, key))
+        self.values[key] = value
+
+    def remove(self, key: str):
+        """Removes `key` from the leaderboard, does nothing if it is absent."""
+        value = self.values.pop(key, None)
+        if value is None:
+            return
+
+        index = bisect.bisect_left(self.entries, (-value, key))
+        del self.entries[index]
+
+    def top(self, count: int) -> list[tuple[str, int]]:
+        """Returns the `count` first `(key, value)` pairs."""
+        return [(key, -value) for value, key in self.entries[:count]]
+
+    def rank(self, key: str) -> int | None:
+        """Returns the rank of `key` starting from 1, or None if it is not in
+        the leaderboard. Equal values share the same rank.
+        """
+        value = self.values.get(key)
+        if value is None:
+            return None
+
+        return bisect.bisect_left(self.entries, (-value,)) + 1
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.values
@@ -0,0 +1,111 @@
+"""A sampling profiler which can be enabled on a running bot.
+
+A background thread periodically records the stack of every thread. The
+report uses the collapsed stack format ("frame;frame;frame count" lines),
+which can be rendered by flamegraph.pl or speedscope.
+"""
+
+import collections
+import os
+import sys
+import threading
+import time
+
+__all__ = [
+    "SamplingProfiler",
+]
+
+class SamplingProfiler:
+    stacks: collections.Counter
+
+    def __init__(self, interval: float = 0.005):
+        """Initialize the profiler, the stacks are sampled every `interval`
+        seconds."""
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.thread = None
+        self.stopped = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        if self.running:
+            raise RuntimeError("The profiler is already running")
+
+        self.stacks.clear()
+        self.samples = 0
+        self.stopped.clear()
+        self.thread = threading.Thread(
+            target=self.run,
+            name="profiler",
+            daemon=True,
+        )
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        own_id = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                    )
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def write_collapsed(self, path: str):
+        """Writes the samples to `path` in the collapsed stack format."""
+        with open(path, mode='w', encoding='utf-8') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+    def top(self, count: int = 10, idle: tuple[str, ...] = ()) -> list[tuple[str, float, float]]:
+        """Returns the `count` functions with the most samples, with the
+        percentage of samples where the function is running (self) and where
+        it is in the stack (total).
+        The stacks whose last frame contains one of the `idle` strings (like
+        waiting for events) are ignored.
+        """
+        self_counts = collections.Counter()
+        total_counts = collections.Counter()
+        busy = 0
+
+        for stack, samples in self.stacks.items():
+            frames = stack.split(";")[1:] # without the thread name
+            if len(frames) == 0 or any(name in frames[-1] for name in idle):
+                continue
+            busy += samples
+            self_counts[frames[-1]] += samples
+            for frame in set(frames):
+                total_counts[frame] += samples
+
+        if busy == 0:
+            return []
+
+        return [
+            (frame, 100 * samples / busy, 100 * total_counts[frame] / busy)
+            for frame, samples in self_counts.most_common(count)
+        ]
+
+    def get_summary(self, count: int = 10, idle: tuple[str, ...] = ()) -> str:
+        """Returns the `top` functions as a text table."""
+        lines = [f"{self.samples} samples", f"{'self':>6} {'total':>6}  function"]
+        for frame, self_percent, total_percent in self.top(count, idle):
+            lines.append(f"{self_percent:>5.1f}% {total_percent:>5.1f}%  {frame}")
+        return "\n".join(lines)
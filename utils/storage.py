@@ -1,13 +1,131 @@
 """The functions and classes needed to permanently store data are defined here
 """
 
+import abc
+import gc
 import json
+import marshal
 import os
+import zlib
+
+try:
+    import orjson
+except ImportError: # optional, faster JSON implementation
+    orjson = None
 
 __all__ = [
-    "Storage"
+    "Codec",
+    "JSONCodec",
+    "FastJSONCodec",
+    "SnapshotCodec",
+    "CODECS",
+    "get_codec",
+    "detect_codec",
+    "Storage",
 ]
 
+class Codec(abc.ABC):
+    """Converts the data to bytes and back."""
+    name: str
+
+    @abc.abstractmethod
+    def dumps(self, data) -> bytes:
+        ...
+
+    @abc.abstractmethod
+    def loads(self, raw: bytes):
+        ...
+
+    @abc.abstractmethod
+    def detect(self, raw: bytes) -> bool:
+        """Whether `raw` has been encoded with this codec."""
+
+    def decode(self, raw: bytes):
+        """Same as `loads`, but the garbage collector is paused while the
+        objects are created, which makes large files much faster to load."""
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self.loads(raw)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+class JSONCodec(Codec):
+    """The JSON codec from the standard library."""
+    name = "json"
+
+    def dumps(self, data) -> bytes:
+        return json.dumps(data).encode("utf-8")
+
+    def loads(self, raw: bytes):
+        return json.loads(raw.decode("utf-8"))
+
+    def detect(self, raw: bytes) -> bool:
+        return raw.lstrip()[:1] in (b"{", b"[")
+
+class FastJSONCodec(JSONCodec):
+    """The same JSON format using `orjson`, only available if it is
+    installed."""
+    name = "fastjson"
+
+    def dumps(self, data) -> bytes:
+        return orjson.dumps(data)
+
+    def loads(self, raw: bytes):
+        return orjson.loads(raw)
+
+class SnapshotCodec(Codec):
+    """A compact binary format: the data serialized with `marshal` and
+    compressed with zlib, after a magic header.
+    The marshal format depends on the Python version, so the snapshot should
+    be converted back to JSON before upgrading Python.
+    """
+    name = "snapshot"
+    MAGIC = b"WDBS\x01"
+    COMPRESSION_LEVEL = 1 # the fastest, most of the gain is already there
+
+    def dumps(self, data) -> bytes:
+        return self.MAGIC + zlib.compress(
+            marshal.dumps(data),
+            self.COMPRESSION_LEVEL,
+        )
+
+    def loads(self, raw: bytes):
+        if not self.detect(raw):
+            raise ValueError("This is not a snapshot file")
+        return marshal.loads(zlib.decompress(raw[len(self.MAGIC):]))
+
+    def detect(self, raw: bytes) -> bool:
+        return raw.startswith(self.MAGIC)
+
+CODECS = {codec.name: codec for codec in (JSONCodec(), SnapshotCodec())}
+if orjson is not None:
+    CODECS[FastJSONCodec.name] = FastJSONCodec()
+
+def get_codec(name: str | None = None) -> Codec:
+    """Returns the codec named `name`, or the fastest JSON codec available.
+    Raises:
+      ValueError when the codec doesn't exists or is not installed.
+    """
+    if name is None:
+        return CODECS.get("fastjson", CODECS["json"])
+    if name not in CODECS:
+        raise ValueError(f"Unknown codec {name}, available codecs: {', '.join(CODECS)}")
+    return CODECS[name]
+
+def detect_codec(raw: bytes) -> Codec:
+    """Returns the codec to read `raw`.
+    The JSON files are read with the fastest JSON codec available.
+    Raises:
+      ValueError when the format is unknown.
+    """
+    if CODECS["snapshot"].detect(raw):
+        return CODECS["snapshot"]
+    if CODECS["json"].detect(raw):
+        return get_codec()
+    raise ValueError("Unknown file format")
+
 class Storage:
     data: dict
 
@@ -15,34 +133,41 @@ class Storage:
         self,
         file: str,
         default = {},
+        codec: Codec | None = None,
     ):
         """Initialize the storage object to the file at the path `file`.
+        The data is saved with `codec`, the fastest JSON codec available by
+        default. The codec used to load the file is detected automatically.
         """
         self.file = file
         self.default = default
+        self.codec = codec if codec is not None else get_codec()
 
     def load(self):
         """Loads data from the file.
         Overrides any already and maybe modified data in memory."""
         with open(
             self.file,
-            mode='r',
-            encoding='utf-8',
+            mode='rb',
         ) as file:
-            self.data = json.load(file)
-    
+            raw = file.read()
+        self.data = detect_codec(raw).decode(raw)
+
     def save(self):
         """Save the data from memory to the file.
         Overrides any data on the disk.
         """
+        raw = self.codec.dumps(self.data)
 
+        # write in a temporary file first so the data is never half written
+        temporary_file = self.file + ".tmp"
         with open(
-            self.file,
-            mode='w',
-            encoding='utf-8',
+            temporary_file,
+            mode='wb',
         ) as file:
-            json.dump(self.data, file)
-        
+            file.write(raw)
+        os.replace(temporary_file, self.file)
+
     def load_or_empty(self):
         if os.path.isfile(self.file):
             self.load()